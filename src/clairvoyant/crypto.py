@@ -1,35 +1,261 @@
 import os
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-
-def _derive_key(password: str, salt: bytes, iterations: int = 200_000) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=iterations,
+import sys
+import hashlib
+import secrets
+import threading
+from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+try:
+    from argon2.low_level import hash_secret_raw, Type as Argon2Type
+except ImportError:  # optional dependency
+    hash_secret_raw = None
+
+# tagged payloads: MAGIC || kdf id || aead id || salt || nonce || ciphertext
+# untagged payloads (older releases) are salt || nonce || ciphertext with KDF_LEGACY + AES-GCM
+MAGIC = b"CLV1"
+KDF_LEGACY = 0
+KDF_PBKDF2 = 1
+KDF_ARGON2ID = 2
+AEAD_AESGCM = 1
+AEAD_CHACHA20 = 2
+HEADER_LEN = len(MAGIC) + 2
+NONCE_LEN = 12
+TAG_LEN = 16
+
+LEGACY_ITERATIONS = 200_000
+# KDF_PBKDF2 xors independent pbkdf2 lanes: a guess costs lanes * iterations,
+# while the lanes run side by side here (openssl releases the gil)
+KDF_ITERATIONS = 300_000
+KDF_LANES = 2
+# argon2id: 2 passes over 64 MiB, 2 lanes
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 64 * 1024
+ARGON2_PARALLELISM = 2
+# new payloads use argon2id when argon2-cffi is installed
+DEFAULT_KDF = KDF_ARGON2ID if hash_secret_raw is not None else KDF_PBKDF2
+KEY_CACHE_SIZE = 32
+STREAM_CHUNK = 1 << 20
+
+# ciphers are cached by a keyed digest of the password, never the password itself.
+# a cached cipher holds its derived key in memory until it is evicted; python gives
+# no reliable way to wipe key bytes, so the cache is bounded instead
+_cache_digest_key = os.urandom(32)
+_cipher_cache: "OrderedDict[tuple, SessionCipher]" = OrderedDict()
+_cipher_cache_lock = threading.Lock()
+
+
+def _cpu_has_aes() -> bool:
+    # aes-gcm is only fast (and constant time) with hardware aes instructions
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/cpuinfo') as f:
+                for line in f:
+                    # x86 lists "flags", arm lists "Features"
+                    if line.startswith(('flags', 'Features')):
+                        return 'aes' in line.split(':', 1)[1].split()
+        except OSError:
+            pass
+    # windows/macos: every x86-64 cpu of the last decade and apple silicon have aes
+    return True
+
+
+# new payloads use chacha20-poly1305 where aes would run in software
+DEFAULT_AEAD = AEAD_AESGCM if _cpu_has_aes() else AEAD_CHACHA20
+_AEADS = {AEAD_AESGCM: AESGCM, AEAD_CHACHA20: ChaCha20Poly1305}
+
+
+def _make_aead(aead_id: int, key: bytes):
+    try:
+        return _AEADS[aead_id](key)
+    except KeyError:
+        raise ValueError(f"Unsupported cipher id: {aead_id}") from None
+
+
+def _derive_key(password: str, salt: bytes, iterations: int = LEGACY_ITERATIONS) -> bytes:
+    # hashlib hands the whole loop to openssl (sha extensions where available)
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations, dklen=32)
+
+
+def _derive_key_lanes(password: str, salt: bytes, iterations: int = KDF_ITERATIONS, lanes: int = KDF_LANES) -> bytes:
+    # each lane gets its own salt; first lane runs on the calling thread
+    lane_salts = [salt + i.to_bytes(4, "big") for i in range(1, lanes + 1)]
+    if lanes == 1:
+        return _derive_key(password, lane_salts[0], iterations)
+    with ThreadPoolExecutor(max_workers=lanes - 1) as pool:
+        futures = [pool.submit(_derive_key, password, s, iterations) for s in lane_salts[1:]]
+        acc = int.from_bytes(_derive_key(password, lane_salts[0], iterations), "big")
+        for fut in futures:
+            acc ^= int.from_bytes(fut.result(), "big")
+    return acc.to_bytes(32, "big")
+
+
+def _derive_key_argon2(password: str, salt: bytes) -> bytes:
+    if hash_secret_raw is None:
+        raise ValueError("Payload was encrypted with Argon2id; install argon2-cffi to decrypt it")
+    return hash_secret_raw(
+        password.encode("utf-8"),
+        salt,
+        time_cost=ARGON2_TIME_COST,
+        memory_cost=ARGON2_MEMORY_COST,
+        parallelism=ARGON2_PARALLELISM,
+        hash_len=32,
+        type=Argon2Type.ID,
     )
-    return kdf.derive(password.encode("utf-8"))
+
+
+def _run_kdf(kdf: int, password: str, salt: bytes) -> bytes:
+    if kdf == KDF_ARGON2ID:
+        return _derive_key_argon2(password, salt)
+    if kdf == KDF_PBKDF2:
+        return _derive_key_lanes(password, salt)
+    if kdf == KDF_LEGACY:
+        return _derive_key(password, salt)
+    raise ValueError(f"Unsupported key derivation id: {kdf}")
+
+
+def _password_digest(password: str) -> bytes:
+    return hashlib.blake2b(password.encode("utf-8"), key=_cache_digest_key, digest_size=32).digest()
+
+
+def _salt_and_nonce():
+    # one random draw (one getrandom syscall) for both values
+    rnd = secrets.token_bytes(16 + NONCE_LEN)
+    return rnd[:16], rnd[16:]
+
+
+def _header(kdf: int, aead_id: int) -> bytes:
+    return MAGIC + bytes([kdf, aead_id])
+
+
+def _split_payload(encrypted: bytes):
+    # returns (kdf, aead, salt, nonce, ciphertext) for tagged or legacy payloads
+    if encrypted[:len(MAGIC)] == MAGIC and len(encrypted) >= HEADER_LEN:
+        kdf = encrypted[len(MAGIC)]
+        aead_id = encrypted[len(MAGIC) + 1]
+        body = encrypted[HEADER_LEN:]
+    else:
+        kdf = KDF_LEGACY
+        aead_id = AEAD_AESGCM
+        body = encrypted
+    # salt + nonce + gcm/poly1305 tag at minimum; checked before paying for the kdf
+    if len(body) < 16 + NONCE_LEN + TAG_LEN:
+        raise ValueError("Invalid encrypted payload")
+    return kdf, aead_id, body[:16], body[16:16 + NONCE_LEN], body[16 + NONCE_LEN:]
+
+
+class SessionCipher:
+    """An AEAD instance bound to one derived key and salt.
+
+    Created through ``derive_key_once`` (or the internal cache), so the KDF
+    and the cipher's key setup run once; every message still gets a fresh
+    nonce and the output format matches ``encrypt``, so payloads are read
+    back with the regular ``decrypt`` (which hits the same cache).
+    """
+
+    __slots__ = ("aead", "salt", "header")
+
+    def __init__(self, aead, salt: bytes, header: bytes):
+        self.aead = aead
+        self.salt = salt
+        self.header = header
+
+    def encrypt(self, message: bytes, nonce: Optional[bytes] = None) -> bytes:
+        if nonce is None:
+            nonce = secrets.token_bytes(NONCE_LEN)
+        return self.header + self.salt + nonce + self.aead.encrypt(nonce, message, None)
+
+
+def _new_cipher(password: str, salt: bytes, kdf: int = DEFAULT_KDF, aead_id: int = DEFAULT_AEAD) -> SessionCipher:
+    # the key is handed to the aead as immutable bytes and never wiped: older
+    # cryptography releases (and 42+ on openssl < 3.2) keep a reference to it and
+    # set up the cipher on every call, so zeroing it would silently zero the key.
+    # it lives as long as the cipher does
+    return SessionCipher(_make_aead(aead_id, _run_kdf(kdf, password, salt)), salt, _header(kdf, aead_id))
+
+
+def _cipher_cached(password: str, salt: bytes, kdf: int = DEFAULT_KDF, aead_id: int = DEFAULT_AEAD) -> SessionCipher:
+    # lru cache in front of the kdf and aead setup so repeated (password, salt) pairs are free;
+    # only decrypt() and derive_key_once() go through it, since encrypt() never reuses a salt
+    cache_key = (_password_digest(password), salt, kdf, aead_id)
+    with _cipher_cache_lock:
+        cipher = _cipher_cache.get(cache_key)
+        if cipher is not None:
+            _cipher_cache.move_to_end(cache_key)
+            return cipher
+    cipher = _new_cipher(password, salt, kdf, aead_id)
+    with _cipher_cache_lock:
+        _cipher_cache[cache_key] = cipher
+        while len(_cipher_cache) > KEY_CACHE_SIZE:
+            _cipher_cache.popitem(last=False)
+    return cipher
+
+
+def derive_key_once(password: str) -> SessionCipher:
+    # run the kdf once and reuse the cipher for a multi-message session
+    return _cipher_cached(password, secrets.token_bytes(16))
 
 
 def encrypt(message: bytes, password: str) -> bytes:
-    # encrypt message with password using AES-GCM, returns salt||nonce||ciphertext
-    salt = os.urandom(16)
-    key = _derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    nonce = os.urandom(12)
-    ct = aesgcm.encrypt(nonce, message, None)
-    return salt + nonce + ct
+    # encrypt message with password, returns header||salt||nonce||ciphertext
+    # fresh salt every time, so caching this cipher would only keep its key alive
+    salt, nonce = _salt_and_nonce()
+    return _new_cipher(password, salt).encrypt(message, nonce)
+
+
+def encrypted_size(plain_len: int) -> int:
+    # size of encrypt/encrypt_stream output for a plaintext of plain_len bytes
+    return HEADER_LEN + 16 + NONCE_LEN + plain_len + TAG_LEN
+
+
+def encrypt_stream(file_in, file_out, password: str, chunk: int = STREAM_CHUNK) -> int:
+    # chunked AES-GCM for payloads too large to hold in memory; output matches encrypt()
+    # and is read back with decrypt(). returns the number of bytes written.
+    # always AES-GCM: cryptography has no incremental chacha20-poly1305
+    # the streaming encryptor needs the raw key, so this one bypasses the cipher cache
+    salt, nonce = _salt_and_nonce()
+    key = _run_kdf(DEFAULT_KDF, password, salt)
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+    header = _header(DEFAULT_KDF, AEAD_AESGCM) + salt + nonce
+    file_out.write(header)
+    written = len(header)
+    while True:
+        block = file_in.read(chunk)
+        if not block:
+            break
+        ct = encryptor.update(block)
+        file_out.write(ct)
+        written += len(ct)
+    tail = encryptor.finalize() + encryptor.tag
+    file_out.write(tail)
+    return written + len(tail)
+
+
+def is_encrypted(data: bytes) -> bool:
+    # cheap check before paying for the kdf: tagged payloads carry MAGIC; untagged
+    # payloads from older releases are random bytes, so readable utf-8 counts as plain
+    if data[:len(MAGIC)] == MAGIC and len(data) >= HEADER_LEN + 16 + NONCE_LEN + TAG_LEN:
+        return True
+    if len(data) < 16 + NONCE_LEN + TAG_LEN:
+        return False
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return True
+    return False
 
 
 def decrypt(encrypted: bytes, password: str) -> bytes:
-    # decrypt expecting first 16 bytes salt, next 12 bytes nonce
-    if len(encrypted) < 16 + 12:
-        raise ValueError("Invalid encrypted payload")
-    salt = encrypted[:16]
-    nonce = encrypted[16:28]
-    ct = encrypted[28:]
-    key = _derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    return aesgcm.decrypt(nonce, ct, None)
\ No newline at end of file
+    # accepts tagged payloads and legacy salt||nonce||ciphertext
+    kdf, aead_id, salt, nonce, ct = _split_payload(encrypted)
+    return _cipher_cached(password, salt, kdf, aead_id).aead.decrypt(nonce, ct, None)
+
+
+# warm openssl's cipher setup at import so the first embed doesn't pay for it
+try:
+    _make_aead(DEFAULT_AEAD, bytes(32)).encrypt(bytes(NONCE_LEN), b"", None)
+except Exception:
+    pass
@@ -15,9 +15,12 @@ from PySide6.QtWidgets import (
     QDialog,
     QTextEdit,
 )
-from PySide6.QtCore import Qt, Signal, QThread, QTimer
+from PySide6.QtCore import Qt, Signal, QObject, QRunnable, QThreadPool, QTimer
 from PySide6.QtGui import QIcon, QCursor
+from cryptography.exceptions import InvalidTag
+import enum
 import os
+import shutil
 import sys
 from . import stego, crypto
 
@@ -25,6 +28,90 @@ def resource_path(relative_path):
     base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_path, relative_path)
 
+_VIDEO_EXTS = frozenset({".mp4", ".avi", ".mov", ".mkv"})
+
+def _is_video(path: str) -> bool:
+    """check if path is a video file."""
+    return os.path.splitext(path)[1].lower() in _VIDEO_EXTS
+
+class FileKind(enum.Enum):
+    """kind of the currently selected carrier file."""
+    IMAGE = enum.auto()
+    VIDEO = enum.auto()
+
+class _Utf8PayloadReader:
+    """binary read() over a .txt payload opened like the in-memory path does
+    (utf-8, universal newlines), so both paths embed the same bytes."""
+
+    def __init__(self, path: str):
+        self._f = open(path, 'r', encoding='utf-8')
+
+    def read(self, size: int = -1) -> bytes:
+        return self._f.read(size).encode('utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+def _stream_payload_writer(payload_path: str, password: Optional[str]):
+    """Prepare a payload file for stego.embed_stream_into_video.
+
+    Returns (length, write_payload); write_payload copies the file into the
+    output in chunks, encrypting it on the way when a password is given.
+    Reads the whole file once up front to size it and to reject non-utf-8
+    files the same way loading them would.
+    """
+    try:
+        size = 0
+        with _Utf8PayloadReader(payload_path) as src:
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                size += len(chunk)
+    except (OSError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to read payload file: {e}") from e
+
+    def write_payload(f):
+        with _Utf8PayloadReader(payload_path) as src:
+            if password:
+                crypto.encrypt_stream(src, f, password)
+            else:
+                shutil.copyfileobj(src, f, 1 << 20)
+
+    length = crypto.encrypted_size(size) if password else size
+    return length, write_payload
+
+def _do_embed_stream(input_path: str, output_path: str, payload_path: str, password: Optional[str]):
+    """append-mode embed of a .txt payload file without loading it; runs on a worker thread."""
+    length, write_payload = _stream_payload_writer(payload_path, password)
+    stego.embed_stream_into_video(input_path, output_path, length, write_payload)
+
+def _do_embed(embed_fn, input_path: str, output_path: str, payload: bytes, password: Optional[str]):
+    """encrypt (if requested) and embed; runs on a worker thread since the kdf is slow."""
+    if password:
+        payload = crypto.encrypt(payload, password)
+    embed_fn(input_path, output_path, payload)
+
+def _do_extract(extract_fn, input_path: str, password: Optional[str]) -> bytes:
+    """extract and decrypt (if a passphrase is set); runs on a worker thread."""
+    data = extract_fn(input_path)
+    # skip the kdf entirely for payloads that were not encrypted
+    if data and password and crypto.is_encrypted(data):
+        try:
+            data = crypto.decrypt(data, password)
+        except (InvalidTag, ValueError) as e:
+            if not data.startswith(crypto.MAGIC):
+                # untagged payload that only looked encrypted; show it as extracted
+                return data
+            if isinstance(e, InvalidTag):
+                raise ValueError("Decryption failed: wrong passphrase or the payload was modified.") from None
+            # unsupported kdf/cipher id or argon2-cffi missing; report it as is
+            raise
+    return data
+
 class MessageEditBox(QPlainTextEdit):
     """custom text edit that warns about large pastes."""
     paste_started = Signal()
@@ -75,21 +162,42 @@ class MessageEditBox(QPlainTextEdit):
         # insert the text
         super().insertFromMimeData(source)
 
-class Worker(QThread):
-    done = Signal()
+class WorkerSignals(QObject):
+    done = Signal(object)
     error = Signal(str)
 
+    # signals of started workers, kept alive until one of them is delivered
+    _pending = set()
+
+    def _release(self, *args):
+        WorkerSignals._pending.discard(self)
+
+class Worker(QRunnable):
+    """runs fn(*args, **kwargs) on the shared QThreadPool (threads are reused)."""
+
     def __init__(self, fn, *args, **kwargs):
         super().__init__()
         self.fn = fn
         self.args = args
         self.kwargs = kwargs
+        # QRunnable is not a QObject; signals live on a helper object
+        self.signals = WorkerSignals()
+        self.done = self.signals.done
+        self.error = self.signals.error
+
+    def start(self):
+        # the pool deletes the runnable (and its args) once run() returns;
+        # only the signals have to outlive it until the result is delivered
+        WorkerSignals._pending.add(self.signals)
+        # connected last, so this runs after the caller's slots
+        self.done.connect(self.signals._release)
+        self.error.connect(self.signals._release)
+        QThreadPool.globalInstance().start(self)
 
     def run(self):
         try:
             res = self.fn(*self.args, **self.kwargs)
-            self.result = res
-            self.done.emit()
+            self.done.emit(res)
         except Exception as e:
             self.error.emit(str(e))
 
@@ -131,7 +239,7 @@ class MainWindow(QWidget):
         self.load_txt_btn.clicked.connect(self._load_payload_file)
         top_h.addStretch()
         right_v = QVBoxLayout()
-        self.msg_size_label = QLabel("Message size: 0 bytes")
+        self.msg_size_label = QLabel("Message size: ~0 chars")
         self.cap_used_label = QLabel("Capacity used: 0%")
         self.msg_size_label.setAlignment(Qt.AlignRight)
         self.cap_used_label.setAlignment(Qt.AlignRight)
@@ -142,7 +250,11 @@ class MainWindow(QWidget):
 
         self.msg_edit = MessageEditBox()
         self.msg_edit.main_window = self
-        self.msg_edit.textChanged.connect(self._update_message_metrics)
+        # debounce metrics so a burst of keystrokes triggers a single update
+        self._metrics_timer = QTimer(self)
+        self._metrics_timer.setSingleShot(True)
+        self._metrics_timer.timeout.connect(self._update_message_metrics)
+        self.msg_edit.textChanged.connect(lambda: self._metrics_timer.start(120))
         layout.addWidget(self.msg_edit)
 
         # label to show selected file with clear button
@@ -173,7 +285,7 @@ class MainWindow(QWidget):
         self.eye_btn.setStyleSheet("text-align:center;")
         self.eye_btn.clicked.connect(self._toggle_pass_visible)
         h2.addWidget(self.eye_btn)
-        self.encrypt_cb = QCheckBox("Encrypt payload (AES-GCM)")
+        self.encrypt_cb = QCheckBox("Encrypt payload")
         self.encrypt_cb.stateChanged.connect(self._on_encrypt_toggled)
         h2.addWidget(self.encrypt_cb)
         layout.addLayout(h2)
@@ -235,14 +347,12 @@ class MainWindow(QWidget):
 
         self.setLayout(layout)
         self.current_path: Optional[str] = None
+        self.current_kind: Optional[FileKind] = None  # classified once in open_image
         self.pass_visible = False
         self.cached_capacity: Optional[int] = None  # cache capacity to avoid recalculating on every keystroke
+        self._capacity_request = 0  # id of the latest background capacity estimate
         self.payload_file: Optional[str] = None  # path to selected .txt payload file
 
-    def _is_video(self, path: str) -> bool:
-        """check if path is a video file."""
-        return path.lower().endswith((".mp4", ".avi", ".mov", ".mkv"))
-
     def _update_extract_button_state(self):
         """disable extract button if LSB mode is enabled with MP4 input."""
         if not self.current_path:
@@ -263,19 +373,8 @@ class MainWindow(QWidget):
 
     def _on_lsb_mode_toggled(self):
         """update capacity estimates when LSB mode is toggled."""
-        if self.current_path and self._is_video(self.current_path):
-            try:
-                if self.video_lsb_cb.isChecked():
-                    cap = stego.estimate_video_capacity_lsb(self.current_path)
-                else:
-                    cap = stego.estimate_video_capacity(self.current_path)
-                self.cached_capacity = cap
-                self._update_capacity_display(cap)
-            except (OSError, ValueError):
-                self._update_capacity_display(None)
-                self.cached_capacity = None
-            # update message metrics with new capacity
-            self._update_message_metrics()
+        if self.current_path and self.current_kind is FileKind.VIDEO:
+            self._start_capacity_estimate()
         # update extract button availability
         self._update_extract_button_state()
 
@@ -288,26 +387,41 @@ class MainWindow(QWidget):
         )
         if path:
             self.current_path = path
+            self.current_kind = FileKind.VIDEO if _is_video(path) else FileKind.IMAGE
             self.file_label.setText(path)
-            # estimate capacity and populate cache
-            try:
-                if self._is_video(path):
-                    if getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked():
-                        cap = stego.estimate_video_capacity_lsb(path)
-                    else:
-                        cap = stego.estimate_video_capacity(path)
-                else:
-                    cap = stego.estimate_image_capacity(path)
-                self.cached_capacity = cap
-                self._update_capacity_display(cap)
-            except (OSError, ValueError):
-                self._update_capacity_display(None)
-                self.cached_capacity = None
-            # update message metrics when opening a new file
-            self._update_message_metrics()
+            # estimate capacity in the background (videos may need a probe)
+            self._start_capacity_estimate()
             # update extract button availability
             self._update_extract_button_state()
 
+    def _start_capacity_estimate(self):
+        """estimate capacity for the current file on the thread pool and populate the cache."""
+        if self.current_kind is FileKind.VIDEO:
+            if getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked():
+                estimate_fn = stego.estimate_video_capacity_lsb
+            else:
+                estimate_fn = stego.estimate_video_capacity
+        else:
+            estimate_fn = stego.estimate_image_capacity
+        # a newer request (another file, LSB toggle) invalidates one still in flight
+        self._capacity_request += 1
+        request_id = self._capacity_request
+        self.cached_capacity = None
+        self.capacity_label.setText("(estimating…)")
+        self._update_message_metrics()
+        worker = Worker(estimate_fn, self.current_path)
+        worker.done.connect(lambda cap: self._on_capacity_estimated(request_id, cap))
+        worker.error.connect(lambda _err: self._on_capacity_estimated(request_id, None))
+        worker.start()
+
+    def _on_capacity_estimated(self, request_id: int, cap: Optional[int]):
+        if request_id != self._capacity_request:
+            return
+        self.cached_capacity = cap
+        self._update_capacity_display(cap)
+        # update message metrics with new capacity
+        self._update_message_metrics()
+
     def _load_payload_file(self):
         """open file dialog to select a .txt file as payload."""
         path, _ = QFileDialog.getOpenFileName(
@@ -394,14 +508,8 @@ class MainWindow(QWidget):
             self.capacity_label.setText(f"~{capacity} bytes")
 
     def _show_extracted_message(self, data: bytes):
-        """decrypt (if passphrase set) and display extracted message."""
+        """display extracted (already decrypted) message."""
         try:
-            if self.pass_edit.text():
-                try:
-                    data = crypto.decrypt(data, self.pass_edit.text())
-                except Exception:
-                    # Decryption failed; likely wrong passphrase or tampered data
-                    pass
             text = data.decode("utf-8")
         except UnicodeDecodeError:
             # Not valid UTF-8; show repr of bytes instead
@@ -430,8 +538,20 @@ class MainWindow(QWidget):
         if not self.current_path:
             QMessageBox.warning(self, "No file", "Please select an image or video first.")
             return
+        # append-mode video embeds stream .txt payloads from disk instead of loading them
+        is_lsb_video = bool(getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked())
+        stream_payload = bool(self.payload_file) and self.current_kind is FileKind.VIDEO and not is_lsb_video
+        pw = None
+        if self.encrypt_cb.isChecked():
+            pw = self.pass_edit.text()
+            if not pw:
+                QMessageBox.warning(self, "Passphrase required", "Please enter a passphrase to encrypt.")
+                return
         # get payload from file or textbox
-        if self.payload_file:
+        if stream_payload:
+            # read (and validated) on the worker thread
+            text = None
+        elif self.payload_file:
             try:
                 with open(self.payload_file, 'r', encoding='utf-8') as f:
                     text = f.read().encode("utf-8")
@@ -440,26 +560,10 @@ class MainWindow(QWidget):
                 return
         else:
             text = self.msg_edit.toPlainText().encode("utf-8")
-        # optional encryption
-        if self.encrypt_cb.isChecked():
-            pw = self.pass_edit.text()
-            if not pw:
-                QMessageBox.warning(self, "Passphrase required", "Please enter a passphrase to encrypt.")
-                return
-            text = crypto.encrypt(text, pw)
-
-        # compute capacity (for display only)
-        try:
-            if self._is_video(self.current_path):
-                cap_bytes = stego.estimate_video_capacity(self.current_path)
-            else:
-                cap_bytes = stego.estimate_image_capacity(self.current_path)
-        except (OSError, ValueError):
-            cap_bytes = None
 
         try:
             # suggest output extension matching input type
-            if self._is_video(self.current_path):
+            if self.current_kind is FileKind.VIDEO:
                 # check if using LSB mode with MP4 input - recommend MKV to avoid h264 codec issues
                 is_lsb_mode = getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked()
                 is_mp4_input = self.current_path.lower().endswith('.mp4')
@@ -481,22 +585,24 @@ class MainWindow(QWidget):
             suggested, _ = QFileDialog.getSaveFileName(self, "Save stego file as", default, flt)
             if not suggested:
                 return
-            # run embedding in background for videos to avoid blocking UI
-            if self._is_video(self.current_path):
+            # run encryption + embedding in background to avoid blocking UI
+            if self.current_kind is FileKind.VIDEO:
                 # choose video embed function based on LSB checkbox
-                if getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked():
+                if is_lsb_video:
                     embed_fn = stego.embed_message_into_video_lsb
                 else:
                     embed_fn = stego.embed_message_into_video
-                # keep reference to worker to avoid GC and premature destruction
-                self._worker_embed = Worker(embed_fn, self.current_path, suggested, text)
-                self._disable_ui()
-                self._worker_embed.done.connect(lambda: self._on_embed_finished(suggested))
-                self._worker_embed.error.connect(self._on_worker_error)
-                self._worker_embed.start()
             else:
-                stego.embed_message_into_image(self.current_path, suggested, text)
-                QMessageBox.information(self, "Success", "Message embedded and file saved.")
+                embed_fn = stego.embed_message_into_image
+            if stream_payload:
+                # the payload file is sized, encrypted and copied off the ui thread
+                worker = Worker(_do_embed_stream, self.current_path, suggested, self.payload_file, pw)
+            else:
+                worker = Worker(_do_embed, embed_fn, self.current_path, suggested, text, pw)
+            self._disable_ui()
+            worker.done.connect(lambda _res: self._on_embed_finished(suggested))
+            worker.error.connect(self._on_worker_error)
+            worker.start()
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
@@ -505,7 +611,7 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "No file", "Please select an image or video first.")
             return
         try:
-            if self._is_video(self.current_path):
+            if self.current_kind is FileKind.VIDEO:
                 # warn if trying to extract LSB from MP4 (h264 codec issues on Windows)
                 if getattr(self, 'video_lsb_cb', None) and self.video_lsb_cb.isChecked():
                     is_mp4 = self.current_path.lower().endswith('.mp4')
@@ -523,34 +629,22 @@ class MainWindow(QWidget):
                     extract_fn = stego.extract_message_from_video_lsb
                 else:
                     extract_fn = stego.extract_message_from_video
-                self._worker_extract = Worker(extract_fn, self.current_path)
-                self._disable_ui()
-                self._worker_extract.done.connect(self._on_extract_finished)
-                self._worker_extract.error.connect(self._on_worker_error)
-                self._worker_extract.start()
             else:
-                data = stego.extract_message_from_image(self.current_path)
-                self._show_extracted_message(data)
+                extract_fn = stego.extract_message_from_image
+            # decryption runs in the worker too (kdf would otherwise freeze the window)
+            worker = Worker(_do_extract, extract_fn, self.current_path, self.pass_edit.text() or None)
+            self._disable_ui()
+            worker.done.connect(self._on_extract_finished)
+            worker.error.connect(self._on_worker_error)
+            worker.start()
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
     def _on_embed_finished(self, path: str):
-        # clear worker reference
-        try:
-            self._worker_embed = None
-        except AttributeError:
-            pass
         self._enable_ui()
         QMessageBox.information(self, "Success", f"Message embedded and file saved: {path}")
 
-    def _on_extract_finished(self):
-        # get result from worker
-        data = getattr(self._worker_extract, 'result', None)
-        # clear worker reference
-        try:
-            self._worker_extract = None
-        except AttributeError:
-            pass
+    def _on_extract_finished(self, data: bytes):
         self._enable_ui()
         # prevent duplicate extract dialogs
         if getattr(self, '_extract_dialog_shown', False):
@@ -580,18 +674,16 @@ class MainWindow(QWidget):
         self._update_extract_button_state()
 
     def _update_message_metrics(self):
-        # skip if no file is loaded yet
+        # read the character count from the document instead of copying the text out of qt;
+        # the exact utf-8 size is only computed in embed_message
+        char_count = max(self.msg_edit.document().characterCount() - 1, 0)
+        self.msg_size_label.setText(f"Message size: ~{char_count} chars")
+        # skip capacity if no file is loaded yet
         if self.cached_capacity is None:
-            self.msg_size_label.setText("Message size: 0 bytes")
             self.cap_used_label.setText("Capacity used: N/A")
             return
-        # estimate byte size without encoding (use character count * 4 as worst case for UTF-8)
-        # this avoids the expensive encode() operation for large texts
-        text = self.msg_edit.toPlainText()
-        char_count = len(text)
         # rough estimate: UTF-8 is 1-4 bytes per character; use 1.2x as reasonable approximation
         estimated_size = int(char_count * 1.2)
-        self.msg_size_label.setText(f"Message size: ~{estimated_size} bytes")
         # use cached capacity to avoid recalculating on every keystroke
         cap_bytes = self.cached_capacity
         if cap_bytes == -1:
@@ -1,13 +1,21 @@
 from PIL import Image
 import cv2
+import numpy as np
 import os
+import mmap
 import shutil
-import tempfile
+import struct
 import subprocess
-import glob
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 HEADER_LEN_BYTES = 4
+VIDEO_MARKER = b'CLRV1'
+FRAME_PIPE_BUFSIZE = 1 << 20
+WRITE_AHEAD_FRAMES = 4
+UNPACK_CHUNK = 1 << 16
 
 
 def _get_platform() -> str:
@@ -20,8 +28,10 @@ def _get_platform() -> str:
         return 'linux'
 
 
+@lru_cache(maxsize=1)
 def _find_ffmpeg() -> str:
-    # find ffmpeg binary (bundle → PyInstaller → PATH)
+    # find ffmpeg binary (bundle → PyInstaller → PATH); looked up once per process,
+    # _find_ffmpeg.cache_clear() forces a new search
     platform = _get_platform()
     exe_name = 'ffmpeg.exe' if platform == 'windows' else 'ffmpeg'
 
@@ -53,37 +63,82 @@ def _find_ffmpeg() -> str:
     return path
 
 
-def _bytes_to_bits(data: bytes):
-    for byte in data:
-        for i in range(7, -1, -1):
-            yield (byte >> i) & 1
-
-
-def _bits_to_bytes(bits):
-    b = bytearray()
-    acc = 0
-    count = 0
-    for bit in bits:
-        acc = (acc << 1) | (bit & 1)
-        count += 1
-        if count == 8:
-            b.append(acc)
-            acc = 0
-            count = 0
-    return bytes(b)
-
-
-def _extract_lsb_bits(byte_arrays):
-    # extract lsb bits from byte arrays (generator)
-    for byte_array in byte_arrays:
-        for byte_val in byte_array:
-            yield int(byte_val) & 1
+def _bits_to_bytes(bits) -> bytes:
+    # msb-first; like the old accumulator, a trailing partial byte is dropped
+    arr = np.asarray(bits, dtype=np.uint8) & 1
+    return np.packbits(arr[:arr.size & ~7]).tobytes()
+
+
+def _payload_bits(message: bytes) -> np.ndarray:
+    # length header + message as one bit array (one bit per uint8, msb first);
+    # the message is unpacked from its own buffer in cache-sized chunks instead
+    # of first being copied into header + message
+    msg = np.frombuffer(message, dtype=np.uint8)
+    header_bits = HEADER_LEN_BYTES * 8
+    bits = np.empty(header_bits + msg.size * 8, dtype=np.uint8)
+    header = len(message).to_bytes(HEADER_LEN_BYTES, 'big')
+    bits[:header_bits] = np.unpackbits(np.frombuffer(header, dtype=np.uint8))
+    for off in range(0, msg.size, UNPACK_CHUNK):
+        chunk = msg[off:off + UNPACK_CHUNK]
+        start = header_bits + off * 8
+        bits[start:start + chunk.size * 8] = np.unpackbits(chunk)
+    return bits
+
+
+def _lsb_mask(bits_per_channel: int) -> int:
+    # mask that keeps the untouched high bits of each channel byte
+    if not 1 <= bits_per_channel <= 4:
+        raise ValueError('bits_per_channel must be between 1 and 4')
+    return (0xFF << bits_per_channel) & 0xFF
+
+
+def _to_symbols(bits: np.ndarray, bits_per_channel: int) -> np.ndarray:
+    # group a bit array into bits_per_channel-bit values (msb first), one per
+    # channel byte; the last one is zero-padded
+    if bits_per_channel == 1:
+        return bits
+    pad = -bits.size % bits_per_channel
+    if pad:
+        bits = np.concatenate((bits, np.zeros(pad, dtype=np.uint8)))
+    groups = bits.reshape(-1, bits_per_channel)
+    symbols = groups[:, 0].copy()
+    for j in range(1, bits_per_channel):
+        symbols <<= 1
+        symbols |= groups[:, j]
+    return symbols
+
+
+def _lsb_bits(flat: np.ndarray, bits_per_channel: int) -> np.ndarray:
+    # inverse of _to_symbols: the low bits of each byte as a bit array (msb first)
+    if bits_per_channel == 1:
+        return flat & 1
+    low = np.unpackbits(flat.reshape(-1, 1), axis=1)
+    return low[:, 8 - bits_per_channel:].reshape(-1)
+
+
+def _embed_bits(flat: np.ndarray, bits: np.ndarray, start: int, mask: int = 0xFE) -> int:
+    # write bits[start:] into the low bits of flat (in place), returns the new index;
+    # bits holds one value per channel byte (see _to_symbols) and mask its complement.
+    # in-place ops avoid the temporaries of flat[:n] = (flat[:n] & mask) | bits
+    n = min(flat.size, bits.size - start)
+    flat[:n] &= mask
+    flat[:n] |= bits[start:start + n]
+    return start + n
+
+
+def _open_rgb(path: str) -> Image.Image:
+    # convert only when needed; convert() always copies the whole image
+    img = Image.open(path)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
 
 
 def estimate_image_capacity(image_path: str) -> int:
     # estimate capacity in bytes for image lsb embedding
-    img = Image.open(image_path).convert("RGB")
-    w, h = img.size
+    # (only the size is needed, which Image.open reads without decoding pixels)
+    with Image.open(image_path) as img:
+        w, h = img.size
     total_bits = w * h * 3
     usable_bits = total_bits - (HEADER_LEN_BYTES * 8)
     if usable_bits < 0:
@@ -103,83 +158,204 @@ def estimate_video_capacity(video_path: str) -> int:
 
 
 def embed_message_into_image(input_path: str, output_path: str, message: bytes):
-    img = Image.open(input_path).convert("RGB")
+    img = _open_rgb(input_path)
     w, h = img.size
-    pixel_bytes = bytearray(img.tobytes())
+    pixel_bytes = np.frombuffer(img.tobytes(), dtype=np.uint8).copy()
 
-    length = len(message)
-    payload = length.to_bytes(HEADER_LEN_BYTES, "big") + message
-    payload_bits = list(_bytes_to_bits(payload))
+    payload_bits = _payload_bits(message)
 
-    if len(payload_bits) > len(pixel_bytes):
+    if payload_bits.size > pixel_bytes.size:
         raise ValueError("Payload too large to embed in image")
 
-    for i, bit in enumerate(payload_bits):
-        pixel_bytes[i] = (pixel_bytes[i] & 0xFE) | bit
+    _embed_bits(pixel_bytes, payload_bits, 0)
 
-    out = Image.frombytes("RGB", (w, h), bytes(pixel_bytes))
+    # read straight from the array (no tobytes() copy); it outlives the save
+    out = Image.frombuffer("RGB", (w, h), pixel_bytes, "raw", "RGB", 0, 1)
     out.save(output_path)
 
 
 def extract_message_from_image(input_path: str) -> bytes:
-    img = Image.open(input_path).convert("RGB")
-    pixel_bytes = bytearray(img.tobytes())
+    img = _open_rgb(input_path)
+    pixel_bytes = np.frombuffer(img.tobytes(), dtype=np.uint8)
 
-    header_bits = [(pixel_bytes[i] & 1) for i in range(HEADER_LEN_BYTES * 8)]
-    header = _bits_to_bytes(header_bits)
+    header_bits = HEADER_LEN_BYTES * 8
+    header = np.packbits(pixel_bytes[:header_bits] & 1).tobytes()
     length = int.from_bytes(header, "big")
 
-    total_bits_needed = length * 8
-    bits = [(pixel_bytes[HEADER_LEN_BYTES * 8 + i] & 1) for i in range(total_bits_needed)]
-    return _bits_to_bytes(bits)
+    end = header_bits + length * 8
+    if end > pixel_bytes.size:
+        raise ValueError("No valid embedded message found in image")
+    return np.packbits(pixel_bytes[header_bits:end] & 1).tobytes()
+
+
+def _copy_file_into(src, dst):
+    # copy src into the freshly opened dst, kernel-side (copy_file_range) where
+    # the platform and filesystem allow it, in 1 MiB chunks otherwise
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if n == 0:
+                    break
+                copied += n
+                remaining -= n
+        except OSError:
+            # e.g. cross-device on older kernels; finish with a buffered copy
+            pass
+        # the fd offsets moved underneath the file objects
+        src.seek(copied)
+        dst.seek(copied)
+    shutil.copyfileobj(src, dst, 1 << 20)
 
 
 def embed_message_into_video(input_path: str, output_path: str, message: bytes):
     # append payload to end of video file (stays playable)
+    embed_stream_into_video(input_path, output_path, len(message), lambda f: f.write(message))
+
+
+def embed_stream_into_video(input_path: str, output_path: str, length: int, write_payload):
+    # append-mode embed for payloads too large to hold in memory;
+    # write_payload(f) must write exactly `length` bytes to the open output file
     if not os.path.exists(input_path):
         raise ValueError("Input video file does not exist")
-    marker = b'CLRV1'
-    length = len(message)
-    envelope = marker + length.to_bytes(HEADER_LEN_BYTES, 'big') + message
-    # copy file then append envelope to end
-    shutil.copyfile(input_path, output_path)
-    with open(output_path, 'ab') as f:
-        f.write(envelope)
+    # envelope: marker|length|payload|length|marker, the trailing copy lets
+    # extract find the payload from a fixed offset at eof
+    # opening the output truncates it, which would wipe the input too
+    if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+        raise ValueError("Output file must differ from the input video")
+    length_field = length.to_bytes(HEADER_LEN_BYTES, 'big')
+    # copy file then append envelope to end, through one output handle
+    try:
+        with open(input_path, 'rb') as src, open(output_path, 'wb') as f:
+            _copy_file_into(src, f)
+            f.write(VIDEO_MARKER + length_field)
+            start = f.tell()
+            write_payload(f)
+            if f.tell() - start != length:
+                raise ValueError('payload size does not match the declared length')
+            f.write(length_field + VIDEO_MARKER)
+    except BaseException:
+        # don't leave a truncated output behind
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
 
 
 def extract_message_from_video(input_path: str) -> bytes:
     # read envelope appended to end of file (robust to compression)
     if not os.path.exists(input_path):
         raise ValueError("Input video file does not exist")
-    marker = b'CLRV1'
-    marker_len = len(marker)
-    # read last 10MB chunk (where envelope should be)
-    max_tail = 10 * 1024 * 1024
     fsize = os.path.getsize(input_path)
-    read_len = min(fsize, max_tail)
+    env_len = len(VIDEO_MARKER) + HEADER_LEN_BYTES
     with open(input_path, 'rb') as f:
-        f.seek(fsize - read_len)
-        tail = f.read(read_len)
-    # search for marker from end
-    idx = tail.rfind(marker)
-    if idx == -1:
+        if fsize >= 2 * env_len:
+            f.seek(fsize - env_len)
+            trailer = f.read(env_len)
+            if trailer[HEADER_LEN_BYTES:] == VIDEO_MARKER:
+                length = int.from_bytes(trailer[:HEADER_LEN_BYTES], 'big')
+                start = fsize - env_len - length - env_len
+                if start >= 0:
+                    f.seek(start)
+                    if f.read(env_len) == VIDEO_MARKER + trailer[:HEADER_LEN_BYTES]:
+                        data = f.read(length)
+                        if len(data) == length:
+                            return data
+        # no trailer: files from older releases end with marker|length|payload
+        return _extract_legacy_envelope(f, fsize)
+
+
+def _extract_legacy_envelope(f, fsize: int) -> bytes:
+    if fsize == 0:
         return b""
-    # verify header + length present
-    start = idx + marker_len
-    if start + HEADER_LEN_BYTES > len(tail):
-        return b""
-    length = int.from_bytes(tail[start:start + HEADER_LEN_BYTES], 'big')
-    payload_start = start + HEADER_LEN_BYTES
-    payload_end = payload_start + length
-    if payload_end > len(tail):
-        # payload larger than tail buffer; seek to exact position and read
-        with open(input_path, 'rb') as f:
-            f.seek(fsize - read_len + idx + marker_len + HEADER_LEN_BYTES)
-            data = f.read(length)
-            if len(data) != length:
-                return b""
-            return data
-    return tail[payload_start:payload_end]
+    marker_len = len(VIDEO_MARKER)
+    # search the last 10MB (where envelope should be) through a read-only map,
+    # so only the pages rfind touches are read, not the whole window
+    max_tail = 10 * 1024 * 1024
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # search for marker from end
+        idx = mm.rfind(VIDEO_MARKER, max(0, fsize - max_tail))
+        if idx == -1:
+            return b""
+        # verify header + length present
+        start = idx + marker_len
+        if start + HEADER_LEN_BYTES > fsize:
+            return b""
+        length = int.from_bytes(mm[start:start + HEADER_LEN_BYTES], 'big')
+        payload_start = start + HEADER_LEN_BYTES
+        payload_end = payload_start + length
+        if payload_end > fsize:
+            return b""
+        return mm[payload_start:payload_end]
+
+
+def _probe_video(video_path: str):
+    # (width, height, fps) from container metadata
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("cannot open input video")
+    try:
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        cap.release()
+    return w, h, fps
+
+
+def _open_frame_reader(ffmpeg: str, video_path: str) -> subprocess.Popen:
+    # decode to raw rgb24 frames on stdout (same frames the old png export produced)
+    cmd = [
+        ffmpeg, '-v', 'error', '-nostdin', '-i', video_path, '-vsync', '0',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=FRAME_PIPE_BUFSIZE)
+
+
+def _read_frames(proc: subprocess.Popen, frame_size: int, buffers: int = 1):
+    # yield flat writable uint8 frames from a rawvideo pipe, read straight into a
+    # ring of preallocated buffers (a yielded frame is overwritten `buffers`
+    # frames later); a decoder that exits with an error raises
+    # CalledProcessError at eof instead of looking like a short video
+    ring = [np.empty(frame_size, dtype=np.uint8) for _ in range(buffers)]
+    i = 0
+    while True:
+        frame = ring[i % buffers]
+        if proc.stdout.readinto(frame) < frame_size:
+            _check_process(proc, 'ffmpeg')
+            return
+        yield frame
+        i += 1
+
+
+def _check_process(proc: subprocess.Popen, name: str):
+    returncode = proc.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, name)
+
+
+def _terminate(*procs: subprocess.Popen):
+    # close pipes, kill anything still running and reap it (safe after a clean exit too)
+    for proc in procs:
+        for pipe in (proc.stdin, proc.stdout):
+            if pipe is not None:
+                try:
+                    pipe.close()
+                except OSError:
+                    pass
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def _file_state(path: str):
+    # identity of an existing file, so cleanup can tell whether it was rewritten
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
 
 
 def estimate_video_capacity_lsb(video_path: str, bits_per_channel: int = 1) -> int:
@@ -202,7 +378,12 @@ def estimate_video_capacity_lsb(video_path: str, bits_per_channel: int = 1) -> i
 
 
 def embed_message_into_video_lsb(input_path: str, output_path: str, message: bytes, bits_per_channel: int = 1):
-    # embed message in video frame lsb (ffmpeg preferred, cv2 fallback)
+    # embed message in video frame lsb (ffmpeg preferred, cv2 fallback);
+    # the low bits_per_channel bits of every channel byte carry payload
+    mask = _lsb_mask(bits_per_channel)
+    # the encoder can't overwrite the file it is still decoding from
+    if os.path.exists(input_path) and os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+        raise ValueError("Output file must differ from the input video")
     ffmpeg = _find_ffmpeg()
     if ffmpeg:
         # capacity check
@@ -210,51 +391,64 @@ def embed_message_into_video_lsb(input_path: str, output_path: str, message: byt
         if cap_bytes and len(message) > cap_bytes:
             raise ValueError('payload too large for lsb embedding in this video')
 
-        with tempfile.TemporaryDirectory() as td:
-            frame_pattern = os.path.join(td, 'frame_%06d.png')
-            # extract frames as PNG (lossless)
-            cmd = [ffmpeg, '-y', '-i', input_path, '-vsync', '0', frame_pattern]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            # get fps for reassembly
-            cap = cv2.VideoCapture(input_path)
-            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-            cap.release()
-
-            # load frames in order
-            frames = sorted(glob.glob(os.path.join(td, 'frame_*.png')))
-            if not frames:
+        w, h, fps = _probe_video(input_path)
+        frame_size = w * h * 3
+
+        payload_bits = _to_symbols(_payload_bits(message), bits_per_channel)
+        total_payload_bits = payload_bits.size
+        bit_idx = 0
+
+        # decode -> embed -> encode through pipes, no intermediate frame files;
+        # reassemble with lossless codec (ffv1) and preserve audio
+        prior_output = _file_state(output_path)
+        decoder = _open_frame_reader(ffmpeg, input_path)
+        encoder = subprocess.Popen(
+            [
+                ffmpeg, '-v', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}',
+                '-framerate', str(round(fps, 3)), '-i', '-',
+                '-i', input_path, '-map', '0:v', '-map', '1:a?', '-c:v', 'ffv1', '-c:a', 'copy', output_path
+            ],
+            stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=FRAME_PIPE_BUFSIZE,
+        )
+        frames_written = 0
+        try:
+            try:
+                # writes go through one worker thread so a busy encoder doesn't stall
+                # reading from the decoder; a few frames may be in flight at once
+                pending = deque()
+                with ThreadPoolExecutor(max_workers=1) as writer:
+                    # at most WRITE_AHEAD_FRAMES frames are queued when the next one is
+                    # read, so one extra buffer keeps the ring clear of pending writes
+                    for flat in _read_frames(decoder, frame_size, WRITE_AHEAD_FRAMES + 1):
+                        if bit_idx < total_payload_bits:
+                            bit_idx = _embed_bits(flat, payload_bits, bit_idx, mask)
+                        pending.append(writer.submit(encoder.stdin.write, flat))
+                        if len(pending) > WRITE_AHEAD_FRAMES:
+                            pending.popleft().result()
+                        frames_written += 1
+                    for fut in pending:
+                        fut.result()
+                encoder.stdin.close()
+            except BrokenPipeError:
+                # encoder died; report its exit status rather than the pipe
+                _check_process(encoder, 'ffmpeg')
+                raise
+            _check_process(encoder, 'ffmpeg')
+
+            if not frames_written:
                 raise RuntimeError('no frames extracted from video')
-
-            length = len(message)
-            payload = length.to_bytes(HEADER_LEN_BYTES, 'big') + message
-            payload_bits = list(_bytes_to_bits(payload))
-            total_payload_bits = len(payload_bits)
-            bit_idx = 0
-
-            for fp in frames:
-                if bit_idx >= total_payload_bits:
-                    break
-                img = Image.open(fp).convert('RGB')
-                w, h = img.size
-                pixel_bytes = bytearray(img.tobytes())
-                max_modify = min(len(pixel_bytes), total_payload_bits - bit_idx)
-                for i in range(max_modify):
-                    pixel_bytes[i] = (pixel_bytes[i] & 0xFE) | payload_bits[bit_idx]
-                    bit_idx += 1
-                out_img = Image.frombytes('RGB', (w, h), bytes(pixel_bytes))
-                out_img.save(fp, 'PNG')
-
             if bit_idx < total_payload_bits:
                 raise ValueError('insufficient capacity in frames for payload')
-
-            # reassemble with lossless codec (ffv1) and preserve audio
-            cmd = [
-                ffmpeg, '-y', '-framerate', str(round(fps, 3)), '-i', os.path.join(td, 'frame_%06d.png'),
-                '-i', input_path, '-map', '0:v', '-map', '1:a?', '-c:v', 'ffv1', '-c:a', 'copy', output_path
-            ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return
+        except BaseException:
+            # don't leave a truncated output behind, but leave a file the
+            # encoder never got to open alone
+            _terminate(decoder, encoder)
+            if _file_state(output_path) not in (None, prior_output):
+                os.remove(output_path)
+            raise
+        finally:
+            _terminate(decoder, encoder)
+        return
 
     # fallback: cv2 VideoWriter (unreliable with h264 on windows)
     cap = cv2.VideoCapture(input_path)
@@ -269,7 +463,10 @@ def embed_message_into_video_lsb(input_path: str, output_path: str, message: byt
     # try to reuse input codec if available
     fourcc_int = int(cap.get(cv2.CAP_PROP_FOURCC))
     try:
-        fourcc_guess = "".join([chr((fourcc_int >> (8 * i)) & 0xFF) for i in range(4)])
+        fourcc_guess = struct.pack('<I', fourcc_int & 0xFFFFFFFF).decode('ascii')
+        # binary garbage (or 0) isn't a codec name worth trying
+        if not fourcc_guess.isprintable():
+            fourcc_guess = ''
     except Exception:
         fourcc_guess = ''
 
@@ -293,10 +490,8 @@ def embed_message_into_video_lsb(input_path: str, output_path: str, message: byt
             'lsb embedding works best with ffmpeg. consider using .mkv format.'
         )
 
-    length = len(message)
-    payload = length.to_bytes(HEADER_LEN_BYTES, 'big') + message
-    payload_bits = list(_bytes_to_bits(payload))
-    total_payload_bits = len(payload_bits)
+    payload_bits = _to_symbols(_payload_bits(message), bits_per_channel)
+    total_payload_bits = payload_bits.size
     bit_idx = 0
 
     while True:
@@ -304,48 +499,43 @@ def embed_message_into_video_lsb(input_path: str, output_path: str, message: byt
         if not ret:
             break
         if bit_idx < total_payload_bits:
-            flat = frame.flatten()
-            max_modify = min(len(flat), total_payload_bits - bit_idx)
-            for i in range(max_modify):
-                flat[i] = (int(flat[i]) & 0xFE) | payload_bits[bit_idx]
-                bit_idx += 1
-            frame = flat.reshape(frame.shape)
+            # cap.read() returns a c-contiguous frame, so this is a view and the
+            # kernel writes straight into it
+            bit_idx = _embed_bits(frame.reshape(-1), payload_bits, bit_idx, mask)
         out.write(frame)
 
     cap.release()
     out.release()
 
 
-def extract_message_from_video_lsb(input_path: str) -> bytes:
-    # extract lsb message from video (prefers ffmpeg)
+def extract_message_from_video_lsb(input_path: str, bits_per_channel: int = 1) -> bytes:
+    # extract lsb message from video (prefers ffmpeg); bits_per_channel must match
+    # the value used to embed
+    _lsb_mask(bits_per_channel)
     ffmpeg = _find_ffmpeg()
     if ffmpeg:
         try:
-            return _extract_lsb_via_ffmpeg(input_path, ffmpeg)
-        except subprocess.CalledProcessError:
-            # ffmpeg failed, try cv2 fallback
+            return _extract_lsb_via_ffmpeg(input_path, ffmpeg, bits_per_channel)
+        except (subprocess.CalledProcessError, ValueError):
+            # ffmpeg (or the size probe) failed, try cv2 fallback
             pass
 
     # fallback to cv2 with safeguards
-    return _extract_lsb_via_cv2(input_path)
+    return _extract_lsb_via_cv2(input_path, bits_per_channel)
 
 
-def _extract_lsb_via_ffmpeg(input_path: str, ffmpeg: str) -> bytes:
+def _extract_lsb_via_ffmpeg(input_path: str, ffmpeg: str, bits_per_channel: int = 1) -> bytes:
     # extract lsb bits from video using ffmpeg frame extraction
-    with tempfile.TemporaryDirectory() as td:
-        frame_pattern = os.path.join(td, 'frame_%06d.png')
-        cmd = [ffmpeg, '-y', '-i', input_path, '-vsync', '0', frame_pattern]
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        frames = sorted(glob.glob(os.path.join(td, 'frame_*.png')))
-        if not frames:
-            return b''
-
-        byte_arrays = (bytearray(Image.open(fp).convert('RGB').tobytes()) for fp in frames)
-        return _extract_message_from_bits(_extract_lsb_bits(byte_arrays))
+    w, h, _ = _probe_video(input_path)
+    decoder = _open_frame_reader(ffmpeg, input_path)
+    try:
+        return _extract_message_from_frames(_read_frames(decoder, w * h * 3), bits_per_channel)
+    finally:
+        # stops the decoder early once the message has been read
+        _terminate(decoder)
 
 
-def _extract_lsb_via_cv2(input_path: str) -> bytes:
+def _extract_lsb_via_cv2(input_path: str, bits_per_channel: int = 1) -> bytes:
     # extract lsb bits from video using cv2 (fallback, less reliable)
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
@@ -372,34 +562,45 @@ def _extract_lsb_via_cv2(input_path: str) -> bytes:
                 if not ret or frame is None or frame.size == 0:
                     break
                 frames_read += 1
-                yield frame.flatten()
+                yield frame.reshape(-1)
         finally:
             cap.release()
 
-    return _extract_message_from_bits(_extract_lsb_bits(frame_byte_generator()))
+    return _extract_message_from_frames(frame_byte_generator(), bits_per_channel)
 
 
-def _extract_message_from_bits(bit_generator) -> bytes:
-    # extract message from lsb bit sequence (reads header then payload)
-    header_bits = []
-    payload_bits = []
-    header_bits_needed = HEADER_LEN_BYTES * 8
+def _extract_message_from_frames(frames, bits_per_channel: int = 1) -> bytes:
+    # extract message from the low bits of flat uint8 frames (reads header then payload)
+    k = bits_per_channel
+    header_bits = HEADER_LEN_BYTES * 8
     length = None
-    total_payload_bits = None
-
-    for bit in bit_generator:
-        if len(header_bits) < header_bits_needed:
-            header_bits.append(bit)
-            if len(header_bits) == header_bits_needed:
-                header = _bits_to_bytes(header_bits)
-                length = int.from_bytes(header, 'big')
-                total_payload_bits = length * 8
-                if total_payload_bits == 0:
+    out = bytearray()
+    carry = np.empty(0, dtype=np.uint8)
+    filled = 0
+
+    for flat in frames:
+        pos = 0
+        while pos < flat.size:
+            # read only the channels still needed and pack them as we go; the output
+            # grows with what was read rather than being sized from a possibly garbage header
+            target = header_bits if length is None else header_bits + length * 8
+            n = min(flat.size - pos, -(-(target - filled) // k))
+            bits = _lsb_bits(flat[pos:pos + n], k)
+            pos += n
+            filled += n * k
+            if carry.size:
+                bits = np.concatenate((carry, bits))
+            # frame sizes needn't line up with bytes; the odd bits carry over
+            whole = bits.size & ~7
+            out += _bits_to_bytes(bits[:whole])
+            carry = bits[whole:]
+            if length is None:
+                if len(out) < HEADER_LEN_BYTES:
+                    continue
+                length = int.from_bytes(out[:HEADER_LEN_BYTES], 'big')
+                if length == 0:
                     return b''
-        else:
-            if len(payload_bits) < total_payload_bits:
-                payload_bits.append(bit)
-            if total_payload_bits is not None and len(payload_bits) >= total_payload_bits:
-                return _bits_to_bytes(payload_bits)
+            if len(out) >= HEADER_LEN_BYTES + length:
+                return bytes(out[HEADER_LEN_BYTES:HEADER_LEN_BYTES + length])
 
     return b''